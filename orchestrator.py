@@ -7,6 +7,7 @@ import os
 import requests
 import json
 from sql_agent import PremierLeagueSQLAgent
+from result_encoder import ResultEncoder
 
 class LLMOrchestrator:
 	def stringify(self, value):
@@ -28,6 +29,24 @@ class LLMOrchestrator:
 		# Initialize conversation history
 		self.conversation_history = []  # List of (user_input, response) tuples
 		self.sql_agent = PremierLeagueSQLAgent("all_players_with_details.db")
+		# Compact encoding of SQL results before they are sent to the LLM
+		self.result_encoder = ResultEncoder(max_rows=self.get_max_result_rows(), model=self.model)
+
+	def get_max_result_rows(self):
+		"""
+		Read SQL_RESULT_MAX_ROWS from the environment.
+		Returns:
+			int | None: The row cap, at least 1, or None (no cap) when the value is 0 or empty.
+		"""
+		value = os.environ.get("SQL_RESULT_MAX_ROWS", "50").strip()
+		if not value:
+			return None
+		try:
+			max_rows = int(value)
+		except ValueError:
+			print(f"[INIT] Invalid SQL_RESULT_MAX_ROWS '{value}', using 50")
+			return 50
+		return max(1, max_rows) if max_rows else None
 
 	def make_api_call(self, messages, max_tokens):
 		"""
@@ -83,12 +102,27 @@ class LLMOrchestrator:
 		print(f"[EXECUTE] SQL agent result received: {str(sql_result)[:100]}...")  # First 100 chars
 		return sql_result
 
+	def encode_result(self, sql_result):
+		"""
+		Encode the SQL result in the compact columnar form and log the token savings for this turn.
+		Args:
+			sql_result (str | dict | list): The SQL agent output.
+		Returns:
+			str: The encoded result to pass to the LLM.
+		"""
+		encoded = self.result_encoder.encode(sql_result)
+		stats = self.result_encoder.last_stats
+		saved_pct = 100 * stats["saved_tokens"] / stats["original_tokens"] if stats["original_tokens"] else 0
+		print(f"[ENCODE] SQL result tokens: {stats['original_tokens']} -> {stats['encoded_tokens']} "
+			f"(saved {stats['saved_tokens']}, {saved_pct:.1f}%)")
+		return encoded
+
 	def generate_response(self, user_input, sql_result=None):
 		"""
 		Generate the final response based on the query type and results.
 		"""
 		if sql_result:
-			return self.handle_general_query(user_input, context=sql_result)
+			return self.handle_general_query(user_input, context=self.encode_result(sql_result))
 		return self.handle_general_query(user_input)
 
 	def handle_general_query(self, user_input, context=None):
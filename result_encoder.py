@@ -0,0 +1,298 @@
+# This module defines the `ResultEncoder` class.
+# It converts SQL agent results into a compact, columnar text form before they are passed to the orchestrator LLM.
+# Repeated keys are written once per table, columns holding the same value in every row are hoisted out,
+# and long tables are capped with a "N more rows" marker. Untruncated results decode back to the original JSON.
+
+import csv
+import io
+import json
+from functools import lru_cache
+from itertools import chain
+
+# First line of every columnar result: explains the format to the LLM and marks the text for `decode`
+LEGEND = (
+    "#compact SQL result: @key = field; #table rows=N shown=M, then a CSV header and M rows; "
+    "#const col,value = same value in every row; #text cols = cells are plain text; "
+    "#columns = full column order; #more N = rows left out"
+)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """
+    Look up the tiktoken encoding for a model, falling back to o200k_base.
+    Resolved on first use so importing this module never downloads BPE files.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        pass
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text, model=None):
+    """
+    Count tokens in a piece of text, falling back to a ~4 chars/token estimate without tiktoken.
+    """
+    encoding = get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+class ResultEncoder:
+    """
+    Compact text format:
+
+        #compact SQL result: ...      <- LEGEND line, always first
+        @players                      <- section for a dict key (only when the result is a dict)
+        #table rows=28 shown=28       <- total rows and rows written below
+        #const team,Arsenal           <- column with the same value in every row
+        #text shirt                   <- text columns holding values that would otherwise read as JSON
+        #columns name,team,position   <- original column order, only when the const columns were not last
+        name,position,age             <- header of the columns written per row
+        Bukayo Saka,Forward,24
+        ...
+        #more 8 rows not shown        <- only when rows were capped
+
+    Outside `#text` columns, cells that parse as JSON are JSON values and other cells are text. Anything that is not a list of uniform objects, or would not get shorter, is kept
+    as compact JSON.
+    """
+
+    def __init__(self, max_rows=50, model=None):
+        self.max_rows = max_rows
+        self.model = model
+        self.last_stats = None
+
+    def encode(self, result):
+        """
+        Encode a SQL result for the LLM and record token usage in `last_stats`.
+        Args:
+            result (str | dict | list): Raw SQL agent output, either parsed JSON or a JSON string.
+        Returns:
+            str: The compact text form, or the original text if it is not JSON.
+        """
+        try:
+            original = json.dumps(result) if isinstance(result, (dict, list)) else str(result)
+            data = self.parse(result)
+        except (TypeError, ValueError):
+            original = str(result)
+            data = None
+        if data is None:
+            encoded = original
+        else:
+            encoded = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+            if isinstance(data, list) and self.is_table(data):
+                columnar = f"{LEGEND}\n{self.encode_table(data)}"
+            elif isinstance(data, dict) and self.is_sectionable(data):
+                columnar = f"{LEGEND}\n{self.encode_sections(data)}"
+            else:
+                columnar = encoded
+            # Tiny results can come out longer in columnar form; keep whichever is shorter
+            if len(columnar) < len(encoded):
+                encoded = columnar
+
+        original_tokens = count_tokens(original, self.model)
+        encoded_tokens = count_tokens(encoded, self.model)
+        self.last_stats = {
+            "original_tokens": original_tokens,
+            "encoded_tokens": encoded_tokens,
+            "saved_tokens": original_tokens - encoded_tokens,
+        }
+        return encoded
+
+    def decode(self, text):
+        """
+        Decode the compact text form back into JSON data.
+        Capped tables only return the rows that were written.
+        Args:
+            text (str): Output of `encode`.
+        Returns:
+            dict | list | str: The decoded data, or the text itself if it is not an encoded result.
+        """
+        if text.startswith(LEGEND + "\n"):
+            body = text[len(LEGEND) + 1:]
+            try:
+                if body.startswith("@"):
+                    return self.decode_sections(body)
+                rows, _ = self.decode_table(iter(io.StringIO(body)))
+                return rows
+            except (ValueError, KeyError, IndexError, StopIteration, csv.Error):
+                return text
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+
+    def parse(self, result):
+        if isinstance(result, (dict, list)):
+            return result
+        text = str(result).strip()
+        # The SQL agent often wraps its JSON answer in a markdown code fence
+        if text.startswith("```"):
+            text = text.split("\n", 1)[1] if "\n" in text else ""
+            text = text.rsplit("```", 1)[0]
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def is_table(self, value):
+        if not isinstance(value, list) or not value:
+            return False
+        if not all(isinstance(row, dict) for row in value):
+            return False
+        columns = set(value[0])
+        if not columns or any("\r" in col for col in columns):
+            return False
+        # A header starting like a directive would be read back as one
+        if any(col.startswith(("#const ", "#text ", "#columns ")) for col in columns):
+            return False
+        return all(set(row) == columns for row in value)
+
+    def is_sectionable(self, data):
+        if any(not isinstance(key, str) or "\n" in key for key in data):
+            return False
+        return any(self.is_table(value) for value in data.values())
+
+    def encode_sections(self, data):
+        parts = []
+        for key, value in data.items():
+            parts.append(f"@{key}\n")
+            if self.is_table(value):
+                parts.append(self.encode_table(value))
+            else:
+                parts.append(json.dumps(value, separators=(",", ":"), ensure_ascii=False) + "\n")
+        return "".join(parts)
+
+    def decode_sections(self, text):
+        data = {}
+        # Split on "\n" only; str.splitlines would also break on \r, \u2028 and friends inside values
+        lines = iter(io.StringIO(text))
+        line = next(lines, None)
+        while line is not None:
+            if not line.startswith("@"):
+                raise ValueError(f"Expected a section line: {line!r}")
+            key = line.rstrip("\n")[1:]
+            value_line = next(lines)
+            if value_line.startswith("#table"):
+                data[key], lines = self.decode_table(chain([value_line], lines))
+            else:
+                data[key] = json.loads(value_line)
+            line = next(lines, None)
+        return data
+
+    def is_plain_text(self, value):
+        # The csv writer leaves a bare \r unquoted although the reader treats it as a line break
+        return isinstance(value, str) and "\r" not in value
+
+    def reads_as_json(self, value):
+        try:
+            json.loads(value)
+        except ValueError:
+            return False
+        return True
+
+    def encode_cell(self, value, text=False):
+        if text or (self.is_plain_text(value) and not self.reads_as_json(value)):
+            return value
+        return json.dumps(value, ensure_ascii=False)
+
+    def decode_cell(self, raw, text=False):
+        if text:
+            return raw
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return raw
+
+    def encode_table(self, rows):
+        columns = list(rows[0])
+        constants = {}
+        if len(rows) > 1:
+            for col in columns:
+                first = rows[0][col]
+                if all(row[col] == first and type(row[col]) is type(first) for row in rows):
+                    constants[col] = first
+        row_columns = [col for col in columns if col not in constants]
+        # Text columns only need marking when some value would otherwise decode as JSON
+        text_columns = [
+            col for col in columns
+            if all(self.is_plain_text(row[col]) for row in rows)
+            and any(self.reads_as_json(row[col]) for row in rows)
+        ]
+
+        shown = rows[:self.max_rows] if self.max_rows is not None else rows
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        buffer.write(f"#table rows={len(rows)} shown={len(shown)}\n")
+        for col, value in constants.items():
+            buffer.write("#const ")
+            writer.writerow([col, self.encode_cell(value, col in text_columns)])
+        if text_columns:
+            buffer.write("#text ")
+            writer.writerow(text_columns)
+        if columns != row_columns + list(constants):
+            buffer.write("#columns ")
+            writer.writerow(columns)
+        writer.writerow(row_columns)
+        for row in shown:
+            writer.writerow([self.encode_cell(row[col], col in text_columns) for col in row_columns])
+        if len(shown) < len(rows):
+            buffer.write(f"#more {len(rows) - len(shown)} rows not shown\n")
+        return buffer.getvalue()
+
+    def decode_table(self, lines):
+        """
+        Read one table block from an iterator of lines.
+        Returns:
+            tuple: The decoded rows and an iterator over the lines after the block.
+        """
+        header = next(lines).split()
+        shown = int(dict(part.split("=") for part in header[1:])["shown"])
+        constants = {}
+        text_columns = set()
+        columns = None
+        line = next(lines)
+        while line.startswith(("#const ", "#text ", "#columns ")):
+            directive, rest = line.split(" ", 1)
+            values = next(csv.reader(chain([rest], lines)))
+            if directive == "#const":
+                constants[values[0]] = values[1]
+            elif directive == "#text":
+                text_columns.update(values)
+            else:
+                columns = values
+            line = next(lines)
+        constants = {col: self.decode_cell(raw, col in text_columns) for col, raw in constants.items()}
+        lines = chain([line], lines)
+        reader = csv.reader(lines)
+        row_columns = next(reader)
+        if columns is None:
+            columns = row_columns + list(constants)
+
+        rows = []
+        for _ in range(shown):
+            cells = next(reader)
+            if len(cells) != len(row_columns):
+                raise ValueError(f"Row has {len(cells)} cells, header has {len(row_columns)}")
+            cells = dict(zip(row_columns, cells))
+            rows.append({
+                col: constants[col] if col in constants else self.decode_cell(cells[col], col in text_columns)
+                for col in columns
+            })
+
+        # Skip the elision marker and hand back the remaining lines
+        line = next(lines, None)
+        if line is None:
+            return rows, iter(())
+        if line.startswith("#more "):
+            return rows, lines
+        return rows, chain([line], lines)
@@ -0,0 +1,152 @@
+# Round-trip tests for the compact SQL result encoding in `result_encoder.py`.
+
+import csv
+import io
+import json
+import unittest
+
+from result_encoder import LEGEND, ResultEncoder
+
+
+def squad(size=12):
+    return [
+        {"name": f"Player {i}", "position": "Defender" if i % 2 else "Forward", "team": "Arsenal"}
+        for i in range(size)
+    ]
+
+
+class ResultEncoderRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.encoder = ResultEncoder(max_rows=None)
+
+    def assertRoundTrip(self, data):
+        encoded = self.encoder.encode(data)
+        self.assertEqual(self.encoder.decode(encoded), data)
+        return encoded
+
+    def test_table(self):
+        encoded = self.assertRoundTrip(squad())
+        self.assertTrue(encoded.startswith(LEGEND + "\n#table rows=12 shown=12\n"))
+
+    def test_sections(self):
+        data = {"team": "Arsenal", "players": squad(), "count": 12, "meta": {"season": "25/26"}}
+        encoded = self.assertRoundTrip(data)
+        self.assertTrue(encoded.startswith(LEGEND + "\n@team\n"))
+
+    def test_const_columns_hoisted(self):
+        encoded = self.assertRoundTrip(squad())
+        self.assertIn("#const team,Arsenal\n", encoded)
+        self.assertEqual(encoded.count("Arsenal"), 1)
+
+    def test_header_matches_row_width(self):
+        rows = [
+            {"name": f"P{i}", "team": "Arsenal", "position": "Defender" if i % 2 else "Forward", "age": 20 + i}
+            for i in range(12)
+        ]
+        encoded = self.assertRoundTrip(rows)
+        lines = encoded.split("\n")
+        self.assertIn("#const team,Arsenal", lines)
+        self.assertIn("#columns name,team,position,age", lines)
+        records = list(csv.reader(io.StringIO("\n".join(lines[4:]))))
+        self.assertEqual(records[0], ["name", "position", "age"])
+        self.assertEqual(records[1], ["P0", "Forward", "20"])
+        self.assertTrue(all(len(record) == len(records[0]) for record in records[1:13]))
+
+    def test_columns_directive_only_when_needed(self):
+        encoded = self.assertRoundTrip(squad())
+        self.assertNotIn("\n#columns ", encoded)
+
+    def test_mixed_value_types(self):
+        rows = [
+            {"name": "A", "value": 1, "flag": True},
+            {"name": "B", "value": 2.5, "flag": False},
+            {"name": "C", "value": None, "flag": None},
+            {"name": "D", "value": "7", "flag": [1, {"x": "y"}]},
+            {"name": "null", "value": "", "flag": " 3"},
+        ] * 3
+        encoded = self.assertRoundTrip(rows)
+        self.assertNotIn("#json", encoded)
+        decoded = self.encoder.decode(encoded)
+        self.assertIs(type(decoded[0]["value"]), int)
+        self.assertIs(type(decoded[1]["value"]), float)
+        self.assertIs(type(decoded[3]["value"]), str)
+        self.assertEqual(decoded[4]["name"], "null")
+
+    def test_text_columns_that_read_as_json(self):
+        rows = [{"id": str(i), "height": f"{180 + i}.0", "name": f"P{i}", "foot": "Right"} for i in range(12)]
+        rows[3]["name"] = "true"
+        encoded = self.assertRoundTrip(rows)
+        self.assertIn("#text id,height,name\n", encoded)
+        self.assertIn("\n0,180.0,P0\n", encoded)
+
+    def test_csv_special_characters(self):
+        for special in [",", '"', "\n", "\r", "\r\n", "\u2028", "\x0b", "\x85", "#more ", "@x"]:
+            with self.subTest(special=special):
+                rows = squad()
+                rows[1]["name"] = f"pl1{special}x"
+                rows[2]["name"] = special
+                self.assertRoundTrip(rows)
+                self.assertRoundTrip({"p": rows, "note": f"line{special}sep"})
+
+    def test_special_characters_in_const_column(self):
+        rows = squad()
+        for row in rows:
+            row["team"] = "Brighton & Hove, \"Albion\"\r\n "
+        self.assertRoundTrip(rows)
+
+    def test_all_constant_table(self):
+        rows = [{"team": "Arsenal", "season": 2025}] * 12
+        encoded = self.assertRoundTrip(rows)
+        self.assertIn("#const season,2025\n", encoded)
+        self.assertIn("#const team,Arsenal\n", encoded)
+        self.assertRoundTrip({"rows": rows, "after": "ok"})
+
+    def test_string_result_in_code_fence(self):
+        data = {"players": squad()}
+        encoded = self.encoder.encode("```json\n" + json.dumps(data) + "\n```")
+        self.assertEqual(self.encoder.decode(encoded), data)
+
+    def test_non_json_text_passes_through(self):
+        for text in ["No players found.", "@Arsenal has 25 players", "#table of results: none", LEGEND]:
+            with self.subTest(text=text):
+                encoded = self.encoder.encode(text)
+                self.assertEqual(encoded, text)
+                self.assertEqual(self.encoder.last_stats["saved_tokens"], 0)
+                self.assertEqual(self.encoder.decode(encoded), text)
+
+    def test_malformed_columnar_text_is_returned_unchanged(self):
+        for text in [LEGEND + "\n#table rows=3", LEGEND + "\n@players\n#table rows=2 shown=2\na,b\n1\n"]:
+            with self.subTest(text=text):
+                self.assertEqual(self.encoder.decode(text), text)
+
+    def test_unserialisable_result_falls_back_to_str(self):
+        result = {"players": [{"name": "A", "joined": object()}]}
+        self.assertEqual(self.encoder.encode(result), str(result))
+
+    def test_reports_token_savings(self):
+        self.encoder.encode(squad(30))
+        stats = self.encoder.last_stats
+        self.assertGreater(stats["saved_tokens"], 0)
+        self.assertEqual(stats["original_tokens"] - stats["encoded_tokens"], stats["saved_tokens"])
+
+
+class ResultEncoderTruncationTest(unittest.TestCase):
+    def test_more_marker_drops_only_capped_rows(self):
+        rows = squad(10)
+        encoder = ResultEncoder(max_rows=4)
+        encoded = encoder.encode({"players": rows, "count": 10})
+        self.assertIn("#table rows=10 shown=4\n", encoded)
+        self.assertIn("#more 6 rows not shown\n", encoded)
+        self.assertEqual(encoder.decode(encoded), {"players": rows[:4], "count": 10})
+
+    def test_no_marker_below_cap(self):
+        encoded = ResultEncoder(max_rows=10).encode(squad(10))
+        self.assertNotIn("\n#more", encoded)
+
+    def test_no_cap(self):
+        encoded = ResultEncoder(max_rows=None).encode(squad(80))
+        self.assertIn("#table rows=80 shown=80\n", encoded)
+
+
+if __name__ == "__main__":
+    unittest.main()